@@ -1,11 +1,34 @@
 #!/usr/bin/env python3
 
+import io
+import os
 import sys
+import functools
+from concurrent.futures import ThreadPoolExecutor
+import objc
 import Quartz
 from Foundation import NSURL
 
+# Upper bound on threads used to pull page text out of one PDF
+MAX_PAGE_WORKERS = 8
+# Each extra worker re-opens the PDF, so only add one per this many pages
+MIN_PAGES_PER_WORKER = 4
+
 def extract_text_from_pdf(pdf_path):
     """Extract text from PDF using Vision framework"""
+    try:
+        st = os.stat(pdf_path)
+    except OSError as e:
+        print(f"Error extracting text from {pdf_path}: {e}")
+        return ""
+
+    # mtime and size in the key so a changed file is re-extracted
+    return _extract_text(pdf_path, st.st_mtime_ns, st.st_size)
+
+
+@functools.lru_cache(maxsize=256)
+def _extract_text(pdf_path, mtime_ns, size):
+    """Cached worker for extract_text_from_pdf"""
     try:
         # Load PDF
         pdf_url = NSURL.fileURLWithPath_(pdf_path)
@@ -15,22 +38,66 @@ def extract_text_from_pdf(pdf_path):
             print(f"Warning: Could not load PDF: {pdf_path}")
             return ""
 
-        all_text = []
         page_count = pdf_doc.pageCount()
+        workers = min(MAX_PAGE_WORKERS, page_count // MIN_PAGES_PER_WORKER)
+
+        if workers > 1:
+            # Interleave pages across workers; this thread takes the first share with the
+            # document already open, the others each open their own
+            chunks = [range(i, page_count, workers) for i in range(workers)]
+            with ThreadPoolExecutor(max_workers=workers - 1) as ex:
+                futures = [ex.submit(_extract_pages, pdf_url, chunk) for chunk in chunks[1:]]
+                page_texts = _page_texts(pdf_doc, chunks[0])
+                for chunk, future in zip(chunks[1:], futures):
+                    chunk_texts = future.result()
+                    if chunk_texts is None:
+                        print(f"Warning: Could not load PDF in worker, reading its pages here: {pdf_path}")
+                        chunk_texts = _page_texts(pdf_doc, chunk)
+                    page_texts.extend(chunk_texts)
+            page_texts.sort(key=lambda pt: pt[0])
+        else:
+            page_texts = _page_texts(pdf_doc, range(page_count))
 
-        for page_num in range(page_count):
-            page = pdf_doc.pageAtIndex_(page_num)
-            if page:
-                text = page.string()
-                if text:
-                    all_text.append(f"=== PAGE {page_num + 1} ===\n{text}")
+        # Write straight into one buffer rather than building per-page strings to join
+        buf = io.StringIO()
+        for page_num, text in page_texts:
+            if text:
+                if buf.tell():
+                    buf.write("\n\n")
+                buf.write("=== PAGE ")
+                buf.write(str(page_num + 1))
+                buf.write(" ===\n")
+                buf.write(text)
 
-        return "\n\n".join(all_text)
+        return buf.getvalue()
 
     except Exception as e:
         print(f"Error extracting text from {pdf_path}: {e}")
         return ""
 
+
+def _page_texts(pdf_doc, page_nums):
+    """Return (page_num, text) for each page number in an open PDFDocument"""
+    page_texts = []
+    for page_num in page_nums:
+        page = pdf_doc.pageAtIndex_(page_num)
+        page_texts.append((page_num, page.string() if page else None))
+    return page_texts
+
+
+def _extract_pages(pdf_url, page_nums):
+    """Thread worker: extract text for some pages using a private PDFDocument
+
+    Returns None if the document can't be opened.
+    """
+    # PDFDocument isn't documented as thread-safe, so never share one across threads
+    with objc.autorelease_pool():
+        pdf_doc = Quartz.PDFDocument.alloc().initWithURL_(pdf_url)
+        if pdf_doc is None:
+            return None
+        return _page_texts(pdf_doc, page_nums)
+
+
 if __name__ == "__main__":
     if len(sys.argv) != 2:
         print("Usage: debug_pdf.py <pdf_file>")
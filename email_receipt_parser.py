@@ -4,43 +4,132 @@ Parse receipts directly from email files (.eml)
 More reliable than PDFs for Trainline, hotel bookings, etc.
 """
 
-import email
 import re
-from email import policy
 from datetime import datetime
+from multiprocessing import Pool
+from email import policy
+from email.errors import HeaderParseError
+from email.header import decode_header, make_header
+from email.parser import BytesHeaderParser, BytesParser
+
+# Optional Arrow kernels for batch parsing (pip install pyarrow)
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+# Stop collecting text/plain parts once the body reaches this size
+MAX_BODY_CHARS = 512 * 1024
+
+# Month words a date may use, full or abbreviated, lower-cased -> month number
+_MONTH_NAMES = ('January', 'February', 'March', 'April', 'May', 'June',
+                'July', 'August', 'September', 'October', 'November', 'December')
+_MONTH_NUM = {name.lower(): i for i, m in enumerate(_MONTH_NAMES, 1) for name in (m, m[:3])}
+
+# Patterns used by the email parsers, compiled once at import time.
+# Digits are ASCII [0-9] so the batch path (RE2) matches the same amounts and dates.
+_TOTAL_LABEL = 'Total amount:'
+_TOTAL_RE = re.compile(r'Total amount:\s*£(?P<cost>[0-9.]+)')
+# Anchored just after a literal find of _TOTAL_LABEL, so the scan stays linear
+_PRICE_TAIL_RE = re.compile(r'\s*£([0-9.]+)')
+_DATE_RE = re.compile(r'\b(?P<day>[0-9]{1,2})\s+(?P<month>(?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)[a-z]*)'
+                      r'\s+(?P<year>[0-9]{4})\b', re.IGNORECASE)
+# Station names are bounded to a single line so a miss can't rescan the rest of the body
+_ROUTE_RES = [re.compile(p, re.IGNORECASE) for p in (
+    r'return trip\s+(?P<origin>[^(\n]{1,60})\s+to\s+(?P<destination>[^\n(]{1,60})',
+    r'booking confirmation for\s+(?P<origin>[^t\n]{1,60})\s+to\s+(?P<destination>[^\n(]{1,60})',
+)]
+# One pattern per label, tried in order; each keeps its literal prefix for a fast
+# search, and the gap can't contain £ so there is no backtracking
+_HOTEL_COST_PATTERNS = [
+    re.compile(rf'{label}[^\n£]{{0,80}}£(?P<cost>[0-9.]+)', re.IGNORECASE)
+    for label in ('Total', 'Amount', 'Price')
+]
+
+# RE2's \s and \b are ASCII-only; these spell out what they mean in Python (Unicode
+# whitespace, and a boundary against Unicode letters/digits/_) for the Arrow kernels
+_RE2_SPACE = '[\\t\\n\\x0b\\x0c\\r\\x1c-\\x1f \\x85\\xa0\u1680\u2000-\u200a\u2028\u2029\u202f\u205f\u3000]'
+_RE2_START_BOUNDARY = r'(?:^|[^\p{L}\p{N}_])'
+_RE2_END_BOUNDARY = r'(?:[^\p{L}\p{N}_]|$)'
+
+
+def _re2_pattern(regex):
+    """Translate one of the patterns above for Arrow's extract_regex (RE2), keeping its matches"""
+    pattern = regex.pattern
+    if regex.flags & re.IGNORECASE:
+        # Python's case folding also maps Turkish İ and ı onto i, RE2's doesn't.
+        # Every i outside a group name is a literal letter (or inside [a-z])
+        pattern = pattern.replace('[a-z]', '[a-z\u0130\u0131]')
+        pattern = re.sub(r'\(\?P<\w+>|i', lambda m: '[i\u0130\u0131]' if m.group() == 'i' else m.group(), pattern)
+    pattern = pattern.replace(r'\s', _RE2_SPACE)
+    # \b only appears at the ends, next to a digit; extract_regex only returns groups,
+    # so consuming the neighbouring character instead of asserting it is harmless
+    if pattern.startswith(r'\b'):
+        pattern = _RE2_START_BOUNDARY + pattern[2:]
+    if pattern.endswith(r'\b'):
+        pattern = pattern[:-2] + _RE2_END_BOUNDARY
+    return ('(?i)' if regex.flags & re.IGNORECASE else '') + pattern
+
+
+# RE2 versions of the rules; extract_regex needs every group named.
+# Only remaining difference: RE2's Unicode tables may be newer than Python's,
+# so a letter assigned very recently can count as a word character for one only
+_ARROW_TOTAL_PATTERN = _re2_pattern(_TOTAL_RE)
+_ARROW_DATE_PATTERN = _re2_pattern(_DATE_RE)
+_ARROW_ROUTE_PATTERNS = [_re2_pattern(pattern) for pattern in _ROUTE_RES]
+_ARROW_HOTEL_COST_PATTERNS = [_re2_pattern(pattern) for pattern in _HOTEL_COST_PATTERNS]
+
+# Result skeletons, copied per email rather than rebuilt
+_TRAIN_TEMPLATE = {
+    'vendor': 'Trainline',
+    'type': 'train',
+    'date': None,
+    'cost': None,
+    'route': None
+}
+_HOTEL_TEMPLATE = {
+    'vendor': 'Hotel',
+    'type': 'hotel',
+    'date': None,
+    'cost': None,
+    'details': None
+}
+
 
 def parse_trainline_email(email_content):
     """Parse Trainline booking confirmation email"""
-    data = {
-        'vendor': 'Trainline',
-        'type': 'train',
-        'date': None,
-        'cost': None,
-        'route': None
-    }
+    data = _TRAIN_TEMPLATE.copy()
 
-    # Extract total amount
-    total_match = re.search(r'Total amount:\s*£([\d.]+)', email_content)
-    if total_match:
-        data['cost'] = f"£{total_match.group(1)}"
+    # Extract total amount (skip it if there's no £ to find)
+    if '£' in email_content:
+        # Locate the fixed label with a plain find, then only regex the short tail
+        idx = email_content.find(_TOTAL_LABEL)
+        while idx != -1:
+            start = idx + len(_TOTAL_LABEL)
+            total_match = _PRICE_TAIL_RE.match(email_content, start)
+            if total_match:
+                data['cost'] = f"£{total_match.group(1)}"
+                break
+            idx = email_content.find(_TOTAL_LABEL, start)
 
     # Extract journey date
-    date_match = re.search(r'(\d{1,2}\s+(?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)[a-z]*\s+\d{4})', email_content, re.IGNORECASE)
+    date_match = _DATE_RE.search(email_content)
     if date_match:
-        try:
-            parsed_date = datetime.strptime(date_match.group(1), '%d %B %Y')
-            data['date'] = parsed_date.strftime('%d/%m/%Y')
-        except:
-            pass
+        day, month_word, year = date_match.groups()
+        # Only real month names or abbreviations, and only days that exist (no 31 February)
+        month = _MONTH_NUM.get(month_word.lower())
+        if month:
+            try:
+                datetime(int(year), month, int(day))
+                data['date'] = f"{int(day):02d}/{month:02d}/{year}"
+            except ValueError:
+                pass
 
     # Extract route (from -> to)
-    route_patterns = [
-        r'return trip\s+([^(]+?)\s+to\s+([^\n\(]+)',
-        r'booking confirmation for\s+([^t]+?)\s+to\s+([^\n\(]+)',
-    ]
-
-    for pattern in route_patterns:
-        match = re.search(pattern, email_content, re.IGNORECASE)
+    for pattern in _ROUTE_RES:
+        match = pattern.search(email_content)
         if match:
             origin = match.group(1).strip()
             destination = match.group(2).strip()
@@ -52,26 +141,18 @@ def parse_trainline_email(email_content):
 
 def parse_hotel_email(email_content):
     """Parse hotel booking confirmation email"""
-    data = {
-        'vendor': 'Hotel',
-        'type': 'hotel',
-        'date': None,
-        'cost': None,
-        'details': None
-    }
+    data = _HOTEL_TEMPLATE.copy()
 
     # Common hotel booking patterns
     # Booking.com, Hotels.com, direct bookings
 
+    # Cost is the only field extracted, so no £ means nothing to find
+    if '£' not in email_content:
+        return data
+
     # Extract total/cost
-    cost_patterns = [
-        r'Total.*?£([\d.]+)',
-        r'Amount.*?£([\d.]+)',
-        r'Price.*?£([\d.]+)',
-    ]
-
-    for pattern in cost_patterns:
-        match = re.search(pattern, email_content, re.IGNORECASE)
+    for pattern in _HOTEL_COST_PATTERNS:
+        match = pattern.search(email_content)
         if match:
             data['cost'] = f"£{match.group(1)}"
             break
@@ -79,33 +160,173 @@ def parse_hotel_email(email_content):
     return data
 
 
-def parse_eml_file(eml_path):
-    """Parse .eml email file"""
+# Email type -> parser, as detected by read_eml_body
+_PARSERS = {
+    'train': parse_trainline_email,
+    'hotel': parse_hotel_email,
+}
+
+
+def _header_text(value):
+    """Decode a compat32 header value, including RFC 2047 encoded words"""
+    if value is None:
+        return ""
+    try:
+        chunks = decode_header(str(value))
+        return str(make_header(chunks))
+    except HeaderParseError:
+        return str(value)
+    except LookupError:
+        # Unknown charset in an encoded word: fall back to UTF-8, as _part_text does
+        return "".join(c.decode('utf-8', 'replace') if isinstance(c, bytes) else c for c, _ in chunks)
+
+
+def _part_text(part):
+    """Decode a compat32 part's payload using its declared charset"""
+    payload = part.get_payload(decode=True) or b""
+    try:
+        return payload.decode(part.get_content_charset() or 'utf-8', 'replace')
+    except LookupError:
+        return payload.decode('utf-8', 'replace')
+
+
+def read_eml_body(eml_path):
+    """Return (email type, text body) for an .eml file, or (None, None) if no parser applies"""
     with open(eml_path, 'rb') as f:
-        msg = email.message_from_binary_file(f, policy=policy.default)
+        # Read the header block only (up to the first blank line) to decide which
+        # parser applies, so a large attachment isn't read in twice
+        header_lines = []
+        for line in f:
+            header_lines.append(line)
+            if line in (b'\n', b'\r\n'):
+                break
+        headers = BytesHeaderParser(policy=policy.compat32).parsebytes(b"".join(header_lines))
+
+        # Detect email type
+        subject = _header_text(headers['subject']).lower()
+        sender = _header_text(headers['from']).lower()
 
-    # Get email body
-    body = ""
+        if 'trainline' in sender or 'trainline' in subject:
+            email_type = 'train'
+        elif 'hotel' in subject or 'booking' in subject:
+            email_type = 'hotel'
+        else:
+            return None, None
+
+        # Only now parse the full message
+        f.seek(0)
+        msg = BytesParser(policy=policy.compat32).parse(f)
+
+    # Get email body - only text/plain parts are decoded, attachments are never touched
     if msg.is_multipart():
+        parts = []
+        size = 0
         for part in msg.walk():
             if part.get_content_type() == "text/plain":
-                body += part.get_content()
+                parts.append(_part_text(part))
+                size += len(parts[-1])
+                # Receipt details live in the first text parts; don't decode the rest
+                if size >= MAX_BODY_CHARS:
+                    break
             elif part.get_content_type() == "text/html":
                 # Could parse HTML here if needed
                 pass
+        body = "".join(parts)
     else:
-        body = msg.get_content()
+        body = _part_text(msg)
+
+    return email_type, body
+
+
+def parse_eml_file(eml_path):
+    """Parse .eml email file"""
+    email_type, body = read_eml_body(eml_path)
+    if email_type is None:
+        return None
+    return _PARSERS[email_type](body)
+
+
+def _parse_bodies_arrow(email_types, bodies):
+    """Run the email rules over every body at once with Arrow's RE2 kernels"""
+    bodies = pa.array(bodies, type=pa.string())
+    email_types = pa.array(email_types, type=pa.string())
+    is_train = pc.equal(email_types, 'train')
+    is_hotel = pc.equal(email_types, 'hotel')
+    null = pa.scalar(None, pa.string())
 
-    # Detect email type and parse accordingly
-    subject = msg['subject'] or ""
-    sender = msg['from'] or ""
+    def field(matches, name):
+        return pc.struct_field(matches, name)
 
-    if 'trainline' in sender.lower() or 'trainline' in subject.lower():
-        return parse_trainline_email(body)
-    elif 'hotel' in subject.lower() or 'booking' in subject.lower():
-        return parse_hotel_email(body)
+    # Cost: Trainline total for train emails, first labelled amount for hotels
+    train_cost = field(pc.extract_regex(bodies, _ARROW_TOTAL_PATTERN), 'cost')
+    hotel_cost = pc.coalesce(*(
+        field(pc.extract_regex(bodies, pattern), 'cost') for pattern in _ARROW_HOTEL_COST_PATTERNS
+    ))
+    cost = pc.if_else(is_train, train_cost, pc.if_else(is_hotel, hotel_cost, null))
+    cost = pc.binary_join_element_wise('£', cost, '')
 
-    return None
+    # Date: DD/MM/YYYY built from the captured parts, train emails only
+    date_parts = pc.extract_regex(bodies, _ARROW_DATE_PATTERN)
+    day = pc.cast(field(date_parts, 'day'), pa.int8())
+    month_index = pc.index_in(pc.utf8_lower(field(date_parts, 'month')), value_set=pa.array(list(_MONTH_NUM)))
+    month = pc.take(pa.array(list(_MONTH_NUM.values()), pa.int8()), month_index)
+    year = field(date_parts, 'year')
+    date = pc.binary_join_element_wise(
+        pc.utf8_lpad(pc.cast(day, pa.string()), 2, '0'),
+        pc.utf8_lpad(pc.cast(month, pa.string()), 2, '0'),
+        year,
+        '/'
+    )
+    # strptime rolls impossible days over (31/02 -> 02/03), so keep only dates that
+    # survive a round trip; year 0 is out of range for the datetime check in Python
+    round_trip = pc.strftime(pc.strptime(date, format='%d/%m/%Y', unit='s', error_is_null=True), format='%d/%m/%Y')
+    valid_date = pc.and_(pc.equal(round_trip, date), pc.not_equal(year, '0000'))
+    date = pc.if_else(pc.and_(is_train, pc.fill_null(valid_date, False)), date, null)
+
+    # Route: first phrasing that matched, in the same order as the Python parser, train emails only
+    route_parts = [pc.extract_regex(bodies, pattern) for pattern in _ARROW_ROUTE_PATTERNS]
+
+    def first_of(name):
+        return pc.utf8_trim_whitespace(pc.coalesce(*(field(parts, name) for parts in route_parts)))
+
+    route = pc.binary_join_element_wise(
+        'Train from ', first_of('origin'), ' to ', first_of('destination'), ''
+    )
+    route = pc.if_else(is_train, route, null)
+
+    vendor = pc.if_else(is_train, 'Trainline', pc.if_else(is_hotel, 'Hotel', null))
+
+    return pa.table({
+        'vendor': vendor,
+        'type': email_types,
+        'date': date,
+        'cost': cost,
+        'details': route,
+    })
+
+
+def parse_eml_batch(eml_paths, processes=None):
+    """Parse many .eml files in parallel, returning one list per field.
+
+    Columns line up with eml_paths; emails no parser handles get None in every column.
+    With pyarrow installed, workers only read bodies and the rules run as vectorized
+    kernels over all of them; otherwise each worker runs the normal parsers.
+    """
+    if PYARROW_AVAILABLE:
+        with Pool(processes) as pool:
+            emails = pool.map(read_eml_body, eml_paths)
+        return _parse_bodies_arrow([t for t, _ in emails], [b for _, b in emails]).to_pydict()
+
+    with Pool(processes) as pool:
+        rows = pool.map(parse_eml_file, eml_paths)
+
+    return {
+        'vendor': [r['vendor'] if r else None for r in rows],
+        'type': [r['type'] if r else None for r in rows],
+        'date': [r['date'] if r else None for r in rows],
+        'cost': [r['cost'] if r else None for r in rows],
+        'details': [(r.get('route') or r.get('details')) if r else None for r in rows],
+    }
 
 
 if __name__ == "__main__":
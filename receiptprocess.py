@@ -4,14 +4,25 @@ import sys
 import os
 import re
 import csv
+import argparse
+import contextlib
+import functools
+import io
+import queue
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from datetime import datetime
+from dateutil import parser as date_parser
 
 # Check for required dependencies
 try:
+    import objc
     import Quartz
     from Foundation import NSURL
     import Vision
+    from Vision import VNRecognizeTextRequest, VNImageRequestHandler
     from AppKit import NSImage
 except ImportError:
     print("Error: This script requires pyobjc. Install with: pip3 install pyobjc-framework-Quartz pyobjc-framework-Vision")
@@ -27,6 +38,13 @@ except ImportError:
     print("Warning: OpenCV not available. Install with: pip3 install opencv-python numpy")
     print("         Running without image preprocessing.")
 
+# Optional Aho-Corasick keyword matching (pip install pyahocorasick)
+try:
+    import ahocorasick
+    AHOCORASICK_AVAILABLE = True
+except ImportError:
+    AHOCORASICK_AVAILABLE = False
+
 
 def upscale_image(img, target_width=1000, target_height=1000):
     """Upscale low-resolution images to ensure sufficient detail for OCR"""
@@ -174,133 +192,354 @@ def preprocess_image(image_path):
         return image_path
 
 
-def extract_text_with_vision_ocr(pdf_path):
-    """Extract text from PDF using Vision OCR on rendered images"""
+# PDF render scale: A4/letter-sized pages (shorter side at least 500pt; A4 is 595pt wide,
+# US Letter 612pt) have text big enough at 1.5x, small or narrow receipt-sized pages
+# (till slips are ~230pt wide however long they are) need more pixels per point
+LARGE_PAGE_POINTS = 500
+LARGE_PAGE_SCALE = 1.5
+SMALL_PAGE_SCALE = 2.5
+# Pages rendered at LARGE_PAGE_SCALE whose average OCR confidence is below this are retried at SMALL_PAGE_SCALE
+LOW_OCR_CONFIDENCE = 0.5
+
+# Bitmap contexts kept per render thread, by page size
+MAX_CACHED_CONTEXTS = 4
+
+
+@functools.lru_cache(maxsize=1)
+def device_rgb_color_space():
+    """Shared device RGB color space for page rendering"""
+    return Quartz.CGColorSpaceCreateDeviceRGB()
+
+
+def bitmap_context_for(contexts, width, height):
+    """Return a cleared bitmap context of the given size, reusing one from contexts when possible"""
+    context = contexts.get((width, height))
+
+    if context is None:
+        # Create bitmap context
+        context = Quartz.CGBitmapContextCreate(
+            None, width, height, 8, width * 4, device_rgb_color_space(),
+            Quartz.kCGImageAlphaPremultipliedLast
+        )
+        if not context:
+            return None
+        if len(contexts) >= MAX_CACHED_CONTEXTS:
+            contexts.pop(next(iter(contexts)))
+        contexts[(width, height)] = context
+    else:
+        # Back to the blank state of a fresh context
+        Quartz.CGContextClearRect(context, Quartz.CGRectMake(0, 0, width, height))
+
+    return context
+
+
+def page_render_scale(page):
+    """Pick the render scale for a PDF page from its size in points"""
+    bounds = page.boundsForBox_(Quartz.kCGPDFMediaBox)
+    if min(bounds.size.width, bounds.size.height) >= LARGE_PAGE_POINTS:
+        return LARGE_PAGE_SCALE
+    return SMALL_PAGE_SCALE
+
+
+def draw_pdf_page(context, page, scale):
+    """Draw a PDF page into a bitmap context at the given scale"""
+    Quartz.CGContextSaveGState(context)
+    Quartz.CGContextScaleCTM(context, scale, scale)
+    Quartz.CGContextDrawPDFPage(context, page)
+    Quartz.CGContextRestoreGState(context)
+
+
+def render_pdf_page(page, contexts=None, scale=None):
+    """Render a PDF page to a CGImage, preprocessed when OpenCV is available
+
+    Pass the same contexts dict for every page of a document to reuse bitmap buffers.
+    scale defaults to page_render_scale(page).
+    """
+    if scale is None:
+        scale = page_render_scale(page)
+
+    # Render page to image at high resolution
+    bounds = page.boundsForBox_(Quartz.kCGPDFMediaBox)
+    width = int(bounds.size.width * scale)
+    height = int(bounds.size.height * scale)
+
+    context = bitmap_context_for({} if contexts is None else contexts, width, height)
+
+    if not context:
+        return None
+
+    # Scale and render
+    draw_pdf_page(context, page, scale)
+
+    # Get image from context - a copy-on-write snapshot, so the context can be redrawn
+    image = Quartz.CGBitmapContextCreateImage(context)
+
+    if not image:
+        return None
+
+    # For preprocessing, we need to save the image to a temp file,
+    # preprocess it, and load it back
+    temp_path = None
+    preprocessed_path = None
+
     try:
-        from Vision import VNRecognizeTextRequest, VNImageRequestHandler
-        from CoreGraphics import CGRectMake
-        import objc
+        if PREPROCESSING_AVAILABLE:
+            # Save rendered page to temp file
+            temp_fd, temp_path = tempfile.mkstemp(suffix='.png')
+            os.close(temp_fd)
+
+            # Save CGImage to file
+            temp_url = NSURL.fileURLWithPath_(temp_path)
+            dest = Quartz.CGImageDestinationCreateWithURL(temp_url, "public.png", 1, None)
+            if dest:
+                Quartz.CGImageDestinationAddImage(dest, image, None)
+                Quartz.CGImageDestinationFinalize(dest)
+
+                # Preprocess the image
+                preprocessed_path = preprocess_image(temp_path)
+
+                # Load preprocessed image
+                preprocessed_url = NSURL.fileURLWithPath_(preprocessed_path)
+                preprocessed_image_source = Quartz.CGImageSourceCreateWithURL(preprocessed_url, None)
+                if preprocessed_image_source:
+                    image = Quartz.CGImageSourceCreateImageAtIndex(preprocessed_image_source, 0, None)
+    except Exception as e:
+        print(f"    Warning: PDF preprocessing failed: {e}")
+        # Continue with original image
+    finally:
+        # Clean up temp files
+        if temp_path and os.path.exists(temp_path):
+            try:
+                os.remove(temp_path)
+            except:
+                pass
+        if preprocessed_path and preprocessed_path != temp_path and os.path.exists(preprocessed_path):
+            try:
+                os.remove(preprocessed_path)
+            except:
+                pass
 
-        pdf_url = NSURL.fileURLWithPath_(pdf_path)
-        pdf_doc = Quartz.PDFDocument.alloc().initWithURL_(pdf_url)
+    return image
 
-        if pdf_doc is None:
-            return ""
 
-        all_text = []
-        page_count = pdf_doc.pageCount()
+def pixel_buffer_pool_for(pools, width, height):
+    """Return a pool of IOSurface-backed BGRA pixel buffers of the given size, reusing one from pools when possible"""
+    pool = pools.get((width, height))
 
-        for page_num in range(page_count):
-            page = pdf_doc.pageAtIndex_(page_num)
-            if not page:
-                continue
+    if pool is None:
+        attributes = {
+            Quartz.kCVPixelBufferPixelFormatTypeKey: Quartz.kCVPixelFormatType_32BGRA,
+            Quartz.kCVPixelBufferWidthKey: width,
+            Quartz.kCVPixelBufferHeightKey: height,
+            Quartz.kCVPixelBufferIOSurfacePropertiesKey: {},
+            Quartz.kCVPixelBufferCGBitmapContextCompatibilityKey: True,
+        }
+        status, pool = Quartz.CVPixelBufferPoolCreate(None, None, attributes, None)
+        if status != Quartz.kCVReturnSuccess or not pool:
+            return None
+        if len(pools) >= MAX_CACHED_CONTEXTS:
+            pools.pop(next(iter(pools)))
+        pools[(width, height)] = pool
+
+    return pool
+
+
+def render_pdf_page_to_pixel_buffer(page, pools=None, scale=None):
+    """Render a PDF page straight into an IOSurface-backed CVPixelBuffer for Vision
+
+    Used when there is no preprocessing step that needs a CGImage; Vision reads
+    the buffer in place instead of copying a CGImage snapshot.
+    Pass the same pools dict for every page of a document to reuse buffers.
+    scale defaults to page_render_scale(page).
+    """
+    if scale is None:
+        scale = page_render_scale(page)
+
+    bounds = page.boundsForBox_(Quartz.kCGPDFMediaBox)
+    width = int(bounds.size.width * scale)
+    height = int(bounds.size.height * scale)
+
+    pool = pixel_buffer_pool_for({} if pools is None else pools, width, height)
+    if pool is None:
+        return None
+
+    status, pixel_buffer = Quartz.CVPixelBufferPoolCreatePixelBuffer(None, pool, None)
+    if status != Quartz.kCVReturnSuccess or not pixel_buffer:
+        return None
+
+    # Draw through a bitmap context over the buffer's own memory (BGRA, premultiplied)
+    Quartz.CVPixelBufferLockBaseAddress(pixel_buffer, 0)
+    try:
+        bytes_per_row = Quartz.CVPixelBufferGetBytesPerRow(pixel_buffer)
+        data = Quartz.CVPixelBufferGetBaseAddress(pixel_buffer).as_buffer(bytes_per_row * height)
+        context = Quartz.CGBitmapContextCreate(
+            data, width, height, 8, bytes_per_row, device_rgb_color_space(),
+            Quartz.kCGImageAlphaPremultipliedFirst | Quartz.kCGBitmapByteOrder32Little
+        )
+        if not context:
+            return None
+
+        # Pooled buffers keep whatever the last page left in them
+        Quartz.CGContextClearRect(context, Quartz.CGRectMake(0, 0, width, height))
+        draw_pdf_page(context, page, scale)
+    finally:
+        Quartz.CVPixelBufferUnlockBaseAddress(pixel_buffer, 0)
+
+    return pixel_buffer
+
+
+def create_text_request():
+    """Create a Vision text recognition request in accurate mode"""
+    request = VNRecognizeTextRequest.alloc().init()
+    request.setRecognitionLevel_(1)  # Accurate mode
+    request.setUsesLanguageCorrection_(True)
+    return request
+
+
+def ocr_cgimage(image, request=None):
+    """Run Vision text recognition on a CGImage
+
+    Returns (recognized text or None, average candidate confidence).
+    Pass a request from create_text_request() to reuse it across pages.
+    """
+    handler = VNImageRequestHandler.alloc().initWithCGImage_options_(image, {})
+    return perform_text_request(handler, request)
+
+
+def ocr_pixel_buffer(pixel_buffer, request=None):
+    """Run Vision text recognition on a CVPixelBuffer, same results as ocr_cgimage()"""
+    handler = VNImageRequestHandler.alloc().initWithCVPixelBuffer_options_(pixel_buffer, {})
+    return perform_text_request(handler, request)
+
+
+def perform_text_request(handler, request=None):
+    """Perform a text recognition request with a VNImageRequestHandler
+
+    Returns (recognized text or None, average candidate confidence).
+    """
+    if request is None:
+        request = create_text_request()
+
+    success, error = handler.performRequests_error_([request], None)
+
+    if success:
+        observations = request.results()
+        if observations:
+            page_text = []
+            confidences = []
+            for observation in observations:
+                candidates = observation.topCandidates_(1)
+                if candidates and len(candidates) > 0:
+                    page_text.append(candidates[0].string())
+                    confidences.append(candidates[0].confidence())
+            confidence = sum(confidences) / len(confidences) if confidences else 0.0
+            return "\n".join(page_text), confidence
 
-            # Render page to image at high resolution
-            bounds = page.boundsForBox_(Quartz.kCGPDFMediaBox)
-            width = int(bounds.size.width * 2)  # 2x resolution for better OCR
-            height = int(bounds.size.height * 2)
+    return None, 0.0
 
-            # Create bitmap context
-            colorSpace = Quartz.CGColorSpaceCreateDeviceRGB()
-            context = Quartz.CGBitmapContextCreate(
-                None, width, height, 8, width * 4, colorSpace,
-                Quartz.kCGImageAlphaPremultipliedLast
-            )
 
-            if context:
-                # Scale and render
-                Quartz.CGContextScaleCTM(context, 2.0, 2.0)
-                Quartz.CGContextDrawPDFPage(context, page)
+def extract_text_with_vision_ocr(pdf_doc, page_nums):
+    """Extract text from the given pages of an open PDFDocument using Vision OCR on rendered images
 
-                # Get image from context
-                image = Quartz.CGBitmapContextCreateImage(context)
+    Returns a dict of page number -> recognized text for the pages OCR succeeded on.
+    """
+    try:
+        # Pipeline: a render thread rasterizes page N+1 while Vision OCRs page N.
+        # Vision and Quartz drop the GIL inside Objective-C, so a thread is enough.
+        pages = queue.Queue(maxsize=2)
+        render_errors = []
+        # Set when the OCR loop stops taking pages early, so the render thread stops too
+        stop = threading.Event()
+
+        # Preprocessing works on a CGImage written to disk; without it, skip the
+        # CGImage and hand Vision the IOSurface-backed buffer the page was drawn into
+        if PREPROCESSING_AVAILABLE:
+            render_page, ocr_page = render_pdf_page, ocr_cgimage
+        else:
+            render_page, ocr_page = render_pdf_page_to_pixel_buffer, ocr_pixel_buffer
 
+        def render_pages():
+            try:
+                with objc.autorelease_pool():
+                    # Bitmap contexts or pixel buffer pools, by page size
+                    reusable = {}
+                    for page_num in page_nums:
+                        if stop.is_set():
+                            break
+                        page = pdf_doc.pageAtIndex_(page_num)
+                        if page:
+                            scale = page_render_scale(page)
+                            pages.put((page_num, scale, render_page(page, reusable, scale)))
+            except Exception as e:
+                render_errors.append(e)
+            finally:
+                pages.put(None)
+
+        # One request reused for every page, so Vision's setup is paid once per PDF
+        request = create_text_request()
+
+        renderer = threading.Thread(target=render_pages, daemon=True)
+        renderer.start()
+
+        page_texts = {}
+        confidences = {}
+        rendered_all = False
+        try:
+            while True:
+                item = pages.get()
+                if item is None:
+                    rendered_all = True
+                    break
+                page_num, scale, image = item
                 if image:
-                    # For preprocessing, we need to save the image to a temp file,
-                    # preprocess it, and load it back
-                    temp_path = None
-                    preprocessed_path = None
-
-                    try:
-                        if PREPROCESSING_AVAILABLE:
-                            # Save rendered page to temp file
-                            import tempfile
-                            temp_fd, temp_path = tempfile.mkstemp(suffix='.png')
-                            os.close(temp_fd)
-
-                            # Save CGImage to file
-                            temp_url = NSURL.fileURLWithPath_(temp_path)
-                            dest = Quartz.CGImageDestinationCreateWithURL(temp_url, "public.png", 1, None)
-                            if dest:
-                                Quartz.CGImageDestinationAddImage(dest, image, None)
-                                Quartz.CGImageDestinationFinalize(dest)
-
-                                # Preprocess the image
-                                preprocessed_path = preprocess_image(temp_path)
-
-                                # Load preprocessed image
-                                preprocessed_url = NSURL.fileURLWithPath_(preprocessed_path)
-                                preprocessed_image_source = Quartz.CGImageSourceCreateWithURL(preprocessed_url, None)
-                                if preprocessed_image_source:
-                                    image = Quartz.CGImageSourceCreateImageAtIndex(preprocessed_image_source, 0, None)
-                    except Exception as e:
-                        print(f"    Warning: PDF preprocessing failed: {e}")
-                        # Continue with original image
-                    finally:
-                        # Clean up temp files
-                        if temp_path and os.path.exists(temp_path):
-                            try:
-                                os.remove(temp_path)
-                            except:
-                                pass
-                        if preprocessed_path and preprocessed_path != temp_path and os.path.exists(preprocessed_path):
-                            try:
-                                os.remove(preprocessed_path)
-                            except:
-                                pass
-
-                    # Create Vision request
-                    request = VNRecognizeTextRequest.alloc().init()
-                    request.setRecognitionLevel_(1)  # Accurate mode
-                    request.setUsesLanguageCorrection_(True)
-
-                    # Create handler and perform request
-                    handler = VNImageRequestHandler.alloc().initWithCGImage_options_(image, {})
-                    success, error = handler.performRequests_error_([request], None)
-
-                    if success:
-                        observations = request.results()
-                        if observations:
-                            page_text = []
-                            for observation in observations:
-                                candidates = observation.topCandidates_(1)
-                                if candidates and len(candidates) > 0:
-                                    page_text.append(candidates[0].string())
-                            all_text.append("\n".join(page_text))
-
-        return "\n".join(all_text)
+                    page_text, confidence = ocr_page(image, request)
+                    if page_text is not None:
+                        page_texts[page_num] = page_text
+                    if scale < SMALL_PAGE_SCALE:
+                        confidences[page_num] = confidence
+        except Exception as e:
+            # Keep the pages already recognized rather than dropping the whole document
+            print(f"Vision OCR error: {e}")
+            return page_texts
+        finally:
+            if not rendered_all:
+                # Unblock a render thread waiting on the full queue, then let it finish
+                stop.set()
+                while pages.get() is not None:
+                    pass
+            renderer.join()
+
+        if render_errors:
+            print(f"Vision OCR error: {render_errors[0]}")
+            return page_texts
+
+        # Retry low-confidence pages at the higher scale, now the render thread is done with pdf_doc
+        for page_num, confidence in confidences.items():
+            if confidence < LOW_OCR_CONFIDENCE:
+                image = render_page(pdf_doc.pageAtIndex_(page_num), scale=SMALL_PAGE_SCALE)
+                if image:
+                    page_text, retry_confidence = ocr_page(image, request)
+                    if page_text is not None and retry_confidence > confidence:
+                        page_texts[page_num] = page_text
+
+        return page_texts
 
     except Exception as e:
         print(f"Vision OCR error: {e}")
-        return ""
+        return {}
 
 
 def extract_text_from_image(image_path):
     """Extract text from image using Vision OCR with preprocessing"""
     preprocessed_path = None
     try:
-        from Vision import VNRecognizeTextRequest, VNImageRequestHandler
-        from Foundation import NSURL
-
         # Preprocess the image to improve OCR accuracy
         preprocessed_path = preprocess_image(image_path)
 
         image_url = NSURL.fileURLWithPath_(preprocessed_path)
 
         # Create Vision request
-        request = VNRecognizeTextRequest.alloc().init()
-        request.setRecognitionLevel_(1)  # Accurate mode
-        request.setUsesLanguageCorrection_(True)
+        request = create_text_request()
 
         # Create handler and perform request
         handler = VNImageRequestHandler.alloc().initWithURL_options_(image_url, {})
@@ -341,6 +580,29 @@ def extract_text_from_image(image_path):
         return ""
 
 
+# Runs of characters unlikely in real receipt text, used to spot garbled embedded text
+_GARBLED_RE = re.compile(r'[^\w\s£.,:\-/()]{2,}')
+# ASCII bytes the garble pattern allows, for a quick count of everything else
+_CLEAN_ASCII = bytes(b for b in range(128) if not _GARBLED_RE.match(chr(b) * 2))
+
+
+def embedded_text_is_poor(text):
+    """Check if embedded PDF text quality is poor (lots of garbled characters)"""
+    total_chars = len(text)
+
+    # Each garbled run needs at least two suspicious characters, so text where at
+    # most a tenth of the characters (UTF-8 bytes, overcounting £) are suspicious
+    # can't reach the threshold - skip the regex scan for clean text
+    if len(text.encode('utf-8').translate(None, _CLEAN_ASCII)) * 10 <= total_chars:
+        return False
+
+    # Count suspicious patterns that indicate poor OCR
+    garbled_patterns = len(_GARBLED_RE.findall(text))
+
+    # More than 5% looks garbled
+    return total_chars > 0 and (garbled_patterns / (total_chars / 100)) > 5
+
+
 def extract_text_from_pdf(pdf_path):
     """Extract text from PDF - try embedded text first, then Vision OCR if needed"""
     try:
@@ -352,70 +614,81 @@ def extract_text_from_pdf(pdf_path):
             print(f"Warning: Could not load PDF: {pdf_path}")
             return ""
 
-        all_text = []
+        page_texts = {}
+        ocr_pages = []
         page_count = pdf_doc.pageCount()
 
+        # Decide per page: keep good embedded text, OCR only pages that are empty or garbled
         for page_num in range(page_count):
             page = pdf_doc.pageAtIndex_(page_num)
             if page:
                 text = page.string()
                 if text:
-                    all_text.append(text)
-
-        embedded_text = "\n".join(all_text)
+                    page_texts[page_num] = text
+                if not text or embedded_text_is_poor(text):
+                    ocr_pages.append(page_num)
 
-        # Check if text quality is poor (lots of garbled characters)
-        if embedded_text:
-            # Count suspicious patterns that indicate poor OCR
-            garbled_patterns = len(re.findall(r'[^\w\s£.,:\-/()]{2,}', embedded_text))
-            total_chars = len(embedded_text)
+        if ocr_pages:
+            print(f"    (Poor quality text detected on {len(ocr_pages)} page(s), trying Vision OCR...)")
+            # Reuse the open document rather than loading the PDF again
+            page_texts.update(extract_text_with_vision_ocr(pdf_doc, ocr_pages))
 
-            # If more than 5% looks garbled, try Vision OCR
-            if total_chars > 0 and (garbled_patterns / (total_chars / 100)) > 5:
-                print(f"    (Poor quality text detected, trying Vision OCR...)")
-                vision_text = extract_text_with_vision_ocr(pdf_path)
-                if vision_text:
-                    return vision_text
-
-        return embedded_text
+        return "\n".join(page_texts[n] for n in sorted(page_texts))
 
     except Exception as e:
         print(f"Error extracting text from {pdf_path}: {e}")
         return ""
 
 
+# Common OCR errors, all fixed in one pass (see clean_ocr_text)
+_LE_SPLIT = r'(?i:\bl\s+e\b)'  # "l e" -> "le"
+_CLEAN_RE = re.compile('|'.join([
+    # Common airport/location name fixes
+    '(?P<airport>' + '|'.join(map(re.escape, [
+        'Newcast l e Ai rport',
+        'Newcast leAi rport',
+        'Newcast l eAi rport',
+    ])) + ')',
+    # A space after the fixed "le" goes too if a capital follows, as it would for any lowercase letter
+    rf'(?P<le>{_LE_SPLIT})(?:\s+(?=[A-Z])(?!{_LE_SPLIT}))?',
+    # Single spaces between lowercase letter and capital (covers "e A" -> "eA"),
+    # unless the capital is an "L e" that becomes lowercase "le" itself
+    rf'(?<=[a-z])(?P<gap>\s+)(?=[A-Z])(?!{_LE_SPLIT})',
+]))
+_CLEAN_REPLACEMENTS = {
+    # The space is closed up by the lowercase/capital rule, as it was when the fixes ran one after another
+    'airport': 'NewcastleAirport',
+    'le': 'le',
+    'gap': '',
+}
+
+
 def clean_ocr_text(text):
     """Clean up common OCR errors in text"""
-    # Common airport/location name fixes
-    cleaned = text.replace('Newcast l e Ai rport', 'Newcastle Airport')
-    cleaned = cleaned.replace('Newcast leAi rport', 'Newcastle Airport')
-    cleaned = cleaned.replace('Newcast l eAi rport', 'Newcastle Airport')
+    return _CLEAN_RE.sub(lambda m: _CLEAN_REPLACEMENTS[m.lastgroup], text)
+
+
+def first_lines(text, count):
+    """Return the first count lines of text without splitting the rest of it"""
+    return text.split('\n', count)[:count]
+
 
-    # Fix specific patterns
-    cleaned = re.sub(r'\bl\s+e\b', 'le', cleaned, flags=re.IGNORECASE)  # "l e" -> "le"
-    cleaned = re.sub(r'\be\s+A', 'eA', cleaned)  # "e A" -> "eA"
-    # Remove single spaces between lowercase letter and capital
-    cleaned = re.sub(r'([a-z])\s+([A-Z])', r'\1\2', cleaned)
-    return cleaned
+# Common date patterns
+_DATE_PATTERNS = [re.compile(p, re.IGNORECASE) for p in [
+    r'\b(\d{4})[/-](\d{1,2})[/-](\d{1,2})\b',  # YYYY/MM/DD or YYYY-MM-DD
+    r'\b(\d{1,2})[/-](\d{1,2})[/-](\d{2,4})\b',  # DD/MM/YYYY or MM/DD/YYYY
+    r'(\d{2})112J(\d{2})',  # Corrupted OCR: 03112J25 -> 03/11/2025
+    r'\b(January|February|March|April|May|June|July|August|September|October|November|December)\s+(\d{1,2})(?:st|nd|rd|th)?,?\s+(\d{4})\b',  # November 5th, 2025
+    r'\b(\d{1,2})\s+(Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)[a-z]*\s+(\d{2,4})\b',  # DD Month YYYY
+    r'\b(Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)[a-z]*\s+(\d{1,2}),?\s+(\d{2,4})\b',  # Month DD, YYYY
+    r'W•dn[^0-9]*?(\d{2})[^0-9]+(\d{4})',  # Heavily corrupted: W•dnMday 03... 2025
+]]
 
 
 def parse_date(text):
     """Extract date from receipt text and convert to DD/MM/YYYY format"""
-    from dateutil import parser as date_parser
-
-    # Common date patterns
-    date_patterns = [
-        r'\b(\d{4})[/-](\d{1,2})[/-](\d{1,2})\b',  # YYYY/MM/DD or YYYY-MM-DD
-        r'\b(\d{1,2})[/-](\d{1,2})[/-](\d{2,4})\b',  # DD/MM/YYYY or MM/DD/YYYY
-        r'(\d{2})112J(\d{2})',  # Corrupted OCR: 03112J25 -> 03/11/2025
-        r'\b(January|February|March|April|May|June|July|August|September|October|November|December)\s+(\d{1,2})(?:st|nd|rd|th)?,?\s+(\d{4})\b',  # November 5th, 2025
-        r'\b(\d{1,2})\s+(Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)[a-z]*\s+(\d{2,4})\b',  # DD Month YYYY
-        r'\b(Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)[a-z]*\s+(\d{1,2}),?\s+(\d{2,4})\b',  # Month DD, YYYY
-        r'W•dn[^0-9]*?(\d{2})[^0-9]+(\d{4})',  # Heavily corrupted: W•dnMday 03... 2025
-    ]
-
-    for i, pattern in enumerate(date_patterns):
-        match = re.search(pattern, text, re.IGNORECASE)
+    for pattern in _DATE_PATTERNS:
+        match = pattern.search(text)
         if match:
             date_str = match.group(0)
 
@@ -440,24 +713,33 @@ def parse_date(text):
     return ""
 
 
+# Explicit total amount patterns, in priority order
+# IMPORTANT: Use word boundaries to avoid matching "Subtotal" when looking for "Total"
+_TOTAL_PATTERNS = [re.compile(p, re.IGNORECASE) for p in [
+    r'Total[:\s]+amount[:\s]*£?\s*(\d+[.,]\d{2})',
+    r'Grand[:\s]+Total[:\s]*£?\s*(\d+[.,]\d{2})',
+    r'\bTotal[:\s]*£?\s*(\d+[.,]\d{2})',  # Word boundary to avoid "Subtotal"
+    r'Tot¥1[:\s]*£?\s*(\d+[.,]\d{2})',  # OCR error: Total -> Tot¥1
+    r'Amount[:\s]+Due[:\s]*£?\s*(\d+[.,]\d{2})',
+    r'Balance[:\s]+Due[:\s]*£?\s*(\d+[.,]\d{2})',
+    r'Balanc•[:\s]*£?\s*(\d+[.,]\d{2})',  # OCR error: Balance -> Balanc•
+    r'Subtotal[:\s]*\n?\s*[^\d\n]*?(\d+)\s*[.,]\s*(\d{2})',  # Subtotal with garbled text (last resort)
+    r'Subtotal[:\s]*£?\s*(\d+[.,]\d{2})',  # Subtotal (last resort)
+]]
+
+# Loose £ amounts, used when no explicit total is found
+_AMOUNT_PATTERNS = [re.compile(p) for p in [
+    r'£\s*(\d{1,4})[.,](\d{2})\b',  # £12.98 or £12,98
+    r'(\d{2,3})[.,](\d{2})\s*\n',  # Standalone amounts like "148.00\n"
+    r'£\s*(\d{1,4})[.,]([?\d])\b',  # £4.?0 or £4.7 (OCR errors)
+]]
+
+
 def parse_cost(text):
     """Extract cost from receipt text"""
     # First, try to find explicit total amount patterns
-    # IMPORTANT: Use word boundaries to avoid matching "Subtotal" when looking for "Total"
-    total_patterns = [
-        r'Total[:\s]+amount[:\s]*£?\s*(\d+[.,]\d{2})',
-        r'Grand[:\s]+Total[:\s]*£?\s*(\d+[.,]\d{2})',
-        r'\bTotal[:\s]*£?\s*(\d+[.,]\d{2})',  # Word boundary to avoid "Subtotal"
-        r'Tot¥1[:\s]*£?\s*(\d+[.,]\d{2})',  # OCR error: Total -> Tot¥1
-        r'Amount[:\s]+Due[:\s]*£?\s*(\d+[.,]\d{2})',
-        r'Balance[:\s]+Due[:\s]*£?\s*(\d+[.,]\d{2})',
-        r'Balanc•[:\s]*£?\s*(\d+[.,]\d{2})',  # OCR error: Balance -> Balanc•
-        r'Subtotal[:\s]*\n?\s*[^\d\n]*?(\d+)\s*[.,]\s*(\d{2})',  # Subtotal with garbled text (last resort)
-        r'Subtotal[:\s]*£?\s*(\d+[.,]\d{2})',  # Subtotal (last resort)
-    ]
-
-    for pattern in total_patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
+    for pattern in _TOTAL_PATTERNS:
+        match = pattern.search(text)
         if match:
             if len(match.groups()) == 2:  # Garbled format with separate pounds and pence
                 pounds = match.group(1)
@@ -473,14 +755,8 @@ def parse_cost(text):
     # If no explicit total found, look for all £ amounts (but be more selective)
     # Match amounts with £ symbol, ensuring we capture the decimal point properly
     amounts = []
-    amount_patterns = [
-        r'£\s*(\d{1,4})[.,](\d{2})\b',  # £12.98 or £12,98
-        r'(\d{2,3})[.,](\d{2})\s*\n',  # Standalone amounts like "148.00\n"
-        r'£\s*(\d{1,4})[.,]([?\d])\b',  # £4.?0 or £4.7 (OCR errors)
-    ]
-
-    for pattern in amount_patterns:
-        matches = re.findall(pattern, text)
+    for pattern in _AMOUNT_PATTERNS:
+        matches = pattern.findall(text)
         for match in matches:
             if len(match) == 2:
                 pounds = match[0]
@@ -507,84 +783,111 @@ def parse_cost(text):
     return ""
 
 
+# Explicit receipt types, checked in order before any scoring (order matters!)
+# Check for train BEFORE parking (since train PDFs mention "pre-book parking")
+_EXPLICIT_TYPE_KEYWORDS = [
+    ('train', ['trainline', 'advance single', 'anytime day single']),
+    ('parking', ['paybyphone', 'parking receipt', 'airport parking']),
+    ('tube', ['tfl', 'transport for london', 'oyster', 'contactless.tfl']),
+    # Food/restaurant indicators
+    ('food', ['wasabi', 'nonna bakery', 'starbucks', 'costa', 'pret', 'greggs']),
+    ('other', ['dbs', 'disclosure and barring', 'criminal record check']),
+    # Parking keywords (before flight scoring)
+    ('parking', ['parking', 'car park']),
+]
+
+# Scored indicators, used when no explicit type matched; ties go to the earlier type
+_SCORED_TYPE_KEYWORDS = [
+    ('train', ['trainline', 'railway', 'rail', 'advance single', 'anytime', 'platform', 'coach']),
+    ('flight', ['flight', 'airline', 'boarding', 'gate', 'terminal', 'passenger']),
+    ('hotel', ['hotel', 'accommodation', 'check-in', 'check-out', 'room', 'guest']),
+    ('food', ['restaurant', 'cafe', 'coffee', 'breakfast', 'lunch', 'dinner', 'meal', 'food', 'bar', 'pub']),
+]
+
+
+def _build_keyword_automaton():
+    """Build one Aho-Corasick automaton over every type keyword, or None if unavailable"""
+    if not AHOCORASICK_AVAILABLE:
+        return None
+
+    automaton = ahocorasick.Automaton()
+    for _, keywords in _EXPLICIT_TYPE_KEYWORDS + _SCORED_TYPE_KEYWORDS:
+        for kw in keywords:
+            automaton.add_word(kw, kw)
+    automaton.make_automaton()
+    return automaton
+
+
+_KEYWORD_AUTOMATON = _build_keyword_automaton()
+
+
+# Leading characters checked for the highest-priority receipt type
+HEAD_CHARS = 2048
+
+
 def identify_receipt_type(text):
-    """Identify the type of receipt and extract relevant information"""
-    text_lower = text.lower()
+    """Identify the type of receipt and extract relevant information
+
+    Returns (receipt_type, text, text_lower) so callers can reuse the lower-cased
+    text; text_lower is None when the type was settled from the head alone.
+    """
+    # The highest-priority explicit type usually names itself near the top (e.g. "Trainline"),
+    # so try that on a lower-cased head before paying for a lower-cased copy of the whole text
+    head_lower = text[:HEAD_CHARS].lower()
+    first_type, first_keywords = _EXPLICIT_TYPE_KEYWORDS[0]
+    if any(kw in head_lower for kw in first_keywords):
+        return first_type, text, None
+
+    text_lower = head_lower if len(text) <= HEAD_CHARS else text.lower()
+
+    # With Aho-Corasick, find every keyword in one pass over the text;
+    # otherwise fall back to substring checks as each one is needed
+    if _KEYWORD_AUTOMATON is not None:
+        has_keyword = {kw for _, kw in _KEYWORD_AUTOMATON.iter(text_lower)}.__contains__
+    else:
+        has_keyword = text_lower.__contains__
 
     # Check for explicit receipt types first (order matters!)
-    # Check for train BEFORE parking (since train PDFs mention "pre-book parking")
-    if 'trainline' in text_lower or 'advance single' in text_lower or 'anytime day single' in text_lower:
-        return 'train', text
-
-    if 'paybyphone' in text_lower or 'parking receipt' in text_lower or 'airport parking' in text_lower:
-        return 'parking', text
-
-    if 'tfl' in text_lower or 'transport for london' in text_lower or ('oyster' in text_lower) or ('contactless.tfl' in text_lower):
-        return 'tube', text
-
-    # Check for food/restaurant indicators
-    if any(word in text_lower for word in ['wasabi', 'nonna bakery', 'starbucks', 'costa', 'pret', 'greggs']):
-        return 'food', text
-
-    if 'dbs' in text_lower or 'disclosure and barring' in text_lower or 'criminal record check' in text_lower:
-        return 'other', text
-
-    # Check for parking keywords (before flight scoring)
-    parking_keywords = ['parking', 'car park']
-    if any(kw in text_lower for kw in parking_keywords):
-        return 'parking', text
-
-    # Train ticket indicators
-    train_keywords = ['trainline', 'railway', 'rail', 'advance single', 'anytime', 'platform', 'coach']
-    # Flight indicators
-    flight_keywords = ['flight', 'airline', 'boarding', 'gate', 'terminal', 'passenger']
-    # Hotel indicators
-    hotel_keywords = ['hotel', 'accommodation', 'check-in', 'check-out', 'room', 'guest']
-    # Food/Drink indicators
-    food_keywords = ['restaurant', 'cafe', 'coffee', 'breakfast', 'lunch', 'dinner', 'meal', 'food', 'bar', 'pub']
-
-    train_score = sum(1 for kw in train_keywords if kw in text_lower)
-    flight_score = sum(1 for kw in flight_keywords if kw in text_lower)
-    hotel_score = sum(1 for kw in hotel_keywords if kw in text_lower)
-    food_score = sum(1 for kw in food_keywords if kw in text_lower)
-
-    scores = {
-        'train': train_score,
-        'flight': flight_score,
-        'hotel': hotel_score,
-        'food': food_score
-    }
+    for receipt_type, keywords in _EXPLICIT_TYPE_KEYWORDS:
+        if any(has_keyword(kw) for kw in keywords):
+            return receipt_type, text, text_lower
 
-    receipt_type = max(scores, key=scores.get)
+    # Score types in order; a later type needs a strictly higher score, since ties go to the earlier one
+    best_type, best_score = 'other', 0
+    for receipt_type, keywords in _SCORED_TYPE_KEYWORDS:
+        score = sum(1 for kw in keywords if has_keyword(kw))
+        if score > best_score:
+            best_type, best_score = receipt_type, score
 
-    if scores[receipt_type] == 0:
-        return 'other', text
+    return best_type, text, text_lower
 
-    return receipt_type, text
+
+_RETURN_TRIP_RE = re.compile(r'return\s+trip\s+([A-Z][a-z]+(?: [A-Z][a-z]+)*(?:\s+\([^)]+\))?)\s+to\s+([A-Z][a-z]+(?: [A-Z][a-z]+)*)', re.IGNORECASE)
+_PARENTHETICAL_RE = re.compile(r'\s*\([^)]+\)')
+_STATION_RE = re.compile(r'\b([A-Z][a-z]+(?: [A-Z][a-z]+)*)\s+(?:Station|Central|Parkway)\b')
+# Explicit journey patterns (common in train booking confirmations)
+_JOURNEY_PATTERNS = [re.compile(p, re.IGNORECASE | re.DOTALL) for p in [
+    r'(?:from|From:)\s+([A-Z][a-z]+(?: [A-Z][a-z]+)*(?:\s+(?:Station|Central|Parkway))?)\s+(?:to|To:)\s+([A-Z][a-z]+(?: [A-Z][a-z]+)*(?:\s+(?:Station|Central|Parkway))?)',
+    r'Your\s+(?:booking|trip)\s+(?:confirmation\s+)?(?:for|to)\s+([A-Z][a-z]+(?: [A-Z][a-z]+)*)\s+to\s+([A-Z][a-z]+(?: [A-Z][a-z]+)*)',
+    r'(\d{2}:\d{2})\s+([A-Z][a-z]+(?: [A-Z][a-z]+)*(?:\s+(?:Station|Central|Parkway))?)\s+.*?\s+(\d{2}:\d{2})\s+([A-Z][a-z]+(?: [A-Z][a-z]+)*(?:\s+(?:Station|Central|Parkway))?)',
+]]
 
 
 def extract_train_details(text):
     """Extract train journey details"""
     # Check for return trip first
-    return_pattern = r'return\s+trip\s+([A-Z][a-z]+(?: [A-Z][a-z]+)*(?:\s+\([^)]+\))?)\s+to\s+([A-Z][a-z]+(?: [A-Z][a-z]+)*)'
-    return_match = re.search(return_pattern, text, re.IGNORECASE)
+    return_match = _RETURN_TRIP_RE.search(text)
     if return_match:
         origin = return_match.group(1).strip()
         destination = return_match.group(2).strip()
         # Clean up station names (remove parenthetical info)
-        origin = re.sub(r'\s*\([^)]+\)', '', origin)
-        destination = re.sub(r'\s*\([^)]+\)', '', destination)
+        origin = _PARENTHETICAL_RE.sub('', origin)
+        destination = _PARENTHETICAL_RE.sub('', destination)
         return f"Return train: {origin} to {destination}"
 
     # Look for explicit journey patterns (common in train booking confirmations)
-    journey_patterns = [
-        r'(?:from|From:)\s+([A-Z][a-z]+(?: [A-Z][a-z]+)*(?:\s+(?:Station|Central|Parkway))?)\s+(?:to|To:)\s+([A-Z][a-z]+(?: [A-Z][a-z]+)*(?:\s+(?:Station|Central|Parkway))?)',
-        r'Your\s+(?:booking|trip)\s+(?:confirmation\s+)?(?:for|to)\s+([A-Z][a-z]+(?: [A-Z][a-z]+)*)\s+to\s+([A-Z][a-z]+(?: [A-Z][a-z]+)*)',
-        r'(\d{2}:\d{2})\s+([A-Z][a-z]+(?: [A-Z][a-z]+)*(?:\s+(?:Station|Central|Parkway))?)\s+.*?\s+(\d{2}:\d{2})\s+([A-Z][a-z]+(?: [A-Z][a-z]+)*(?:\s+(?:Station|Central|Parkway))?)',
-    ]
-
-    for pattern in journey_patterns:
-        match = re.search(pattern, text, re.IGNORECASE | re.DOTALL)
+    for pattern in _JOURNEY_PATTERNS:
+        match = pattern.search(text)
         if match:
             if len(match.groups()) == 2:
                 origin = match.group(1).strip()
@@ -596,7 +899,7 @@ def extract_train_details(text):
                 return f"Train from {origin} to {destination}"
 
     # Fallback: Look for station names (common UK stations)
-    stations = re.findall(r'\b([A-Z][a-z]+(?: [A-Z][a-z]+)*)\s+(?:Station|Central|Parkway)\b', text)
+    stations = _STATION_RE.findall(text)
 
     comment = "Train ticket"
     if len(stations) >= 2:
@@ -607,10 +910,13 @@ def extract_train_details(text):
     return comment
 
 
+_AIRPORT_CODE_RE = re.compile(r'\b([A-Z]{3})\b')
+
+
 def extract_flight_details(text):
     """Extract flight details"""
     # Look for airport codes (3 letters in caps)
-    airports = re.findall(r'\b([A-Z]{3})\b', text)
+    airports = _AIRPORT_CODE_RE.findall(text)
 
     comment = "Flight ticket"
     if len(airports) >= 2:
@@ -619,28 +925,36 @@ def extract_flight_details(text):
     return comment
 
 
+# Hotel name patterns, including corrupted OCR
+_HOTEL_PATTERNS = [re.compile(p, re.IGNORECASE) for p in [
+    r'(Premier Inn)',
+    r'(Point A Hotel [^\n|]+)',
+    r'([A-Z][a-z]+(?: [A-Z][a-z]+)* Hotel(?: [A-Z][a-z]+)*)',
+    r'(Hotel [A-Z][a-z]+(?: [A-Z][a-z]+)*)',
+]]
+_PIPE_SUFFIX_RE = re.compile(r'\s*\|.*$')
+_ARRIVAL_RE = re.compile(r'(?:Arrival|4JnvAI)[^0-9]*?(\d{2})[/\s]+(\d{2})[/\s]+(\d{4})', re.IGNORECASE)
+_DEPARTURE_RE = re.compile(r'(?:Departure|QapJnuf8)[^0-9]*?(\d{2})[/\s]+(\d{2})[/\s]+(\d{4})', re.IGNORECASE)
+_NIGHTS_RE = re.compile(r'(\d+)\s*night', re.IGNORECASE)
+_LONDON_ADDRESS_RE = re.compile(r'(\d+\s+[^\n]+,\s*London[^\n]*)', re.IGNORECASE)
+_CITY_RE = re.compile(r',\s*(London|Birmingham|Manchester|Cardiff)[,\s]', re.IGNORECASE)
+
+
 def extract_hotel_details(text):
     """Extract hotel details"""
     # Look for hotel name - try multiple patterns including corrupted OCR
-    hotel_patterns = [
-        r'(Premier Inn)',
-        r'(Point A Hotel [^\n|]+)',
-        r'([A-Z][a-z]+(?: [A-Z][a-z]+)* Hotel(?: [A-Z][a-z]+)*)',
-        r'(Hotel [A-Z][a-z]+(?: [A-Z][a-z]+)*)',
-    ]
-
     hotel_name = "Hotel"
-    for pattern in hotel_patterns:
-        hotel_match = re.search(pattern, text, re.IGNORECASE)
+    for pattern in _HOTEL_PATTERNS:
+        hotel_match = pattern.search(text)
         if hotel_match:
             hotel_name = hotel_match.group(1).strip()
             # Clean up common suffixes
-            hotel_name = re.sub(r'\s*\|.*$', '', hotel_name)
+            hotel_name = _PIPE_SUFFIX_RE.sub('', hotel_name)
             break
 
     # Calculate number of nights from Arrival/Departure dates (various formats)
-    arrival_match = re.search(r'(?:Arrival|4JnvAI)[^0-9]*?(\d{2})[/\s]+(\d{2})[/\s]+(\d{4})', text, re.IGNORECASE)
-    departure_match = re.search(r'(?:Departure|QapJnuf8)[^0-9]*?(\d{2})[/\s]+(\d{2})[/\s]+(\d{4})', text, re.IGNORECASE)
+    arrival_match = _ARRIVAL_RE.search(text)
+    departure_match = _DEPARTURE_RE.search(text)
 
     nights = "1"
     if arrival_match and departure_match:
@@ -648,19 +962,19 @@ def extract_hotel_details(text):
         nights = "1"
     else:
         # Look for explicit nights mention
-        nights_match = re.search(r'(\d+)\s*night', text, re.IGNORECASE)
+        nights_match = _NIGHTS_RE.search(text)
         nights = nights_match.group(1) if nights_match else "1"
 
     # Look for location in address
     location = ""
-    address_match = re.search(r'(\d+\s+[^\n]+,\s*London[^\n]*)', text, re.IGNORECASE)
+    address_match = _LONDON_ADDRESS_RE.search(text)
     if address_match:
         location = address_match.group(1).strip()
         # Clean up
-        location = re.sub(r'\s*\|.*$', '', location)
+        location = _PIPE_SUFFIX_RE.sub('', location)
     else:
         # Try to find city name
-        city_match = re.search(r',\s*(London|Birmingham|Manchester|Cardiff)[,\s]', text, re.IGNORECASE)
+        city_match = _CITY_RE.search(text)
         if city_match:
             location = city_match.group(1)
 
@@ -671,44 +985,60 @@ def extract_hotel_details(text):
     return comment
 
 
-def extract_food_details(text):
+# Known restaurant/venue names
+_VENUE_PATTERNS = [re.compile(p, re.IGNORECASE) for p in [
+    r'(Wasabi[^\n]*)',
+    r'(Nonna Bakery[^\n]*)',
+    r'(Starbucks[^\n]*)',
+    r'(Costa[^\n]*)',
+    r'(Pret A Manger[^\n]*)',
+    r'(Greggs[^\n]*)',
+]]
+
+# Venue location patterns
+_FOOD_LOCATION_PATTERNS = [re.compile(p, re.IGNORECASE) for p in [
+    r'(?:Address|Location)[:\s]*([^\n]+)',
+    r'(Paddington[^\n]*Station)',
+    r'(High Holborn)',
+    r'([A-Z][a-z]+\s+Station)',
+]]
+_ADDRESS_SUFFIX_RE = re.compile(r',.*$')
+_VENUE_SKIP_WORDS = ('receipt', 'invoice', 'payment', 'customer', 'till', 'duplicate')
+_NUMERIC_LINE_RE = re.compile(r'^[\d\s\-/:]+$')
+_TIME_RE = re.compile(r'(\d{1,2}):(\d{2})(?:\s*(AM|PM))?', re.IGNORECASE)
+
+
+def extract_food_details(text, text_lower=None):
     """Extract food/drink details"""
-    text_lower = text.lower()
+    if text_lower is None:
+        text_lower = text.lower()
 
     # Look for known restaurant/venue names first
-    venue_patterns = [
-        r'(Wasabi[^\n]*)',
-        r'(Nonna Bakery[^\n]*)',
-        r'(Starbucks[^\n]*)',
-        r'(Costa[^\n]*)',
-        r'(Pret A Manger[^\n]*)',
-        r'(Greggs[^\n]*)',
-    ]
-
     venue = ""
-    for pattern in venue_patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
+    for pattern in _VENUE_PATTERNS:
+        match = pattern.search(text)
         if match:
             venue = match.group(1).strip()
             # Clean up
-            venue = re.sub(r',.*$', '', venue)  # Remove address parts
+            venue = _ADDRESS_SUFFIX_RE.sub('', venue)  # Remove address parts
             break
 
     # If no known venue found, look for restaurant/store name (usually at top of receipt)
     if not venue:
-        lines = text.split('\n')
-        for line in lines[:10]:  # Check first 10 lines
-            if line.strip() and len(line.strip()) > 3 and not re.match(r'^[\d\s\-/:]+$', line):
+        for line in first_lines(text, 10):  # Check first 10 lines
+            stripped = line.strip()
+            if len(stripped) > 3 and not _NUMERIC_LINE_RE.match(line):
                 # Skip common header words
-                if not any(skip in line.lower() for skip in ['receipt', 'invoice', 'payment', 'customer', 'till', 'duplicate']):
-                    venue = line.strip()
+                line_lower = line.lower()
+                if not any(skip in line_lower for skip in _VENUE_SKIP_WORDS):
+                    venue = stripped
                     break
 
     # Determine meal type based on time or keywords
     meal_type = "Meal"
 
     # Check time of day - handle both 24h and 12h with AM/PM
-    time_match = re.search(r'(\d{1,2}):(\d{2})(?:\s*(AM|PM))?', text, re.IGNORECASE)
+    time_match = _TIME_RE.search(text)
     if time_match:
         hour = int(time_match.group(1))
         am_pm = time_match.group(3)
@@ -740,15 +1070,8 @@ def extract_food_details(text):
 
     # Look for location
     location = ""
-    location_patterns = [
-        r'(?:Address|Location)[:\s]*([^\n]+)',
-        r'(Paddington[^\n]*Station)',
-        r'(High Holborn)',
-        r'([A-Z][a-z]+\s+Station)',
-    ]
-
-    for pattern in location_patterns:
-        location_match = re.search(pattern, text, re.IGNORECASE)
+    for pattern in _FOOD_LOCATION_PATTERNS:
+        location_match = pattern.search(text)
         if location_match:
             location = location_match.group(1).strip()
             break
@@ -768,16 +1091,20 @@ def extract_food_details(text):
     return comment
 
 
+_DESCRIPTION_RE = re.compile(r'Description[:\s]*([^\n]+)', re.IGNORECASE)
+_UPPER_STATION_RE = re.compile(r'([A-Z][A-Z\s]+STATION)')
+
+
 def extract_parking_details(text):
     """Extract parking details"""
     # Look for location/description
-    location_match = re.search(r'Description[:\s]*([^\n]+)', text, re.IGNORECASE)
+    location_match = _DESCRIPTION_RE.search(text)
     if location_match:
         location = location_match.group(1).strip()
         return f"Parking at {location}"
 
     # Look for station name
-    station_match = re.search(r'([A-Z][A-Z\s]+STATION)', text)
+    station_match = _UPPER_STATION_RE.search(text)
     if station_match:
         station = station_match.group(1).title()
         return f"Parking at {station}"
@@ -785,11 +1112,13 @@ def extract_parking_details(text):
     return "Parking"
 
 
+_TUBE_JOURNEY_RE = re.compile(r'([A-Z][a-z]+(?: [A-Z][a-z]+)*)\s+to\s+([A-Z][a-z]+(?: [A-Z][a-z]+)*)\s+£(\d+\.\d{2})')
+
+
 def extract_tube_details(text):
     """Extract tube/TfL travel details"""
     # Look for journey details
-    journey_pattern = r'([A-Z][a-z]+(?: [A-Z][a-z]+)*)\s+to\s+([A-Z][a-z]+(?: [A-Z][a-z]+)*)\s+£(\d+\.\d{2})'
-    journeys = re.findall(journey_pattern, text)
+    journeys = _TUBE_JOURNEY_RE.findall(text)
 
     if journeys:
         if len(journeys) == 1:
@@ -802,30 +1131,36 @@ def extract_tube_details(text):
     return "TfL travel"
 
 
+# Payment purpose or description
+_PURPOSE_PATTERNS = [re.compile(p, re.IGNORECASE) for p in [
+    r'Payment for[:\s]*([^\n]+)',
+    r'Purpose[:\s]*([^\n]+)',
+    r'Description[:\s]*([^\n]+)',
+]]
+
+
 def extract_other_details(text):
     """Extract details from other/miscellaneous receipts"""
     # Look for payment purpose or description
-    purpose_patterns = [
-        r'Payment for[:\s]*([^\n]+)',
-        r'Purpose[:\s]*([^\n]+)',
-        r'Description[:\s]*([^\n]+)',
-    ]
-
-    for pattern in purpose_patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
+    for pattern in _PURPOSE_PATTERNS:
+        match = pattern.search(text)
         if match:
             purpose = match.group(1).strip()
             return purpose
 
     # Try to get the first meaningful line as description
-    lines = text.split('\n')
-    for line in lines[:10]:
-        if line.strip() and len(line.strip()) > 10:
-            return line.strip()
+    for line in first_lines(text, 10):
+        stripped = line.strip()
+        if len(stripped) > 10:
+            return stripped
 
     return "Other expense"
 
 
+# TfL travel date followed by a cost amount (e.g., "14/10/2025 £5.80")
+_TFL_DATE_RE = re.compile(r'(\d{2}/\d{2}/\d{4})\s+£\d+\.\d{2}')
+
+
 def process_receipt(file_path):
     """Process a single receipt file (PDF or image) and extract information"""
     filename = os.path.basename(file_path)
@@ -848,13 +1183,12 @@ def process_receipt(file_path):
             'Review': 'REVIEW: no text extracted'
         }
 
-    receipt_type, full_text = identify_receipt_type(text)
+    receipt_type, full_text, text_lower = identify_receipt_type(text)
 
     # For TfL/tube receipts, extract the travel date (not the statement date)
     if receipt_type == 'tube':
         # Look for date followed by cost amount (e.g., "14/10/2025 £5.80")
-        tfl_date_pattern = r'(\d{2}/\d{2}/\d{4})\s+£\d+\.\d{2}'
-        tfl_date_match = re.search(tfl_date_pattern, text)
+        tfl_date_match = _TFL_DATE_RE.search(text)
         if tfl_date_match:
             date = tfl_date_match.group(1)
         else:
@@ -872,7 +1206,7 @@ def process_receipt(file_path):
     elif receipt_type == 'hotel':
         comment = extract_hotel_details(text)
     elif receipt_type == 'food':
-        comment = extract_food_details(text)
+        comment = extract_food_details(text, text_lower)
     elif receipt_type == 'parking':
         comment = extract_parking_details(text)
     elif receipt_type == 'tube':
@@ -901,21 +1235,40 @@ def process_receipt(file_path):
     }
 
 
+RECEIPT_EXTENSIONS = ('.pdf', '.jpg', '.jpeg', '.png')
+
+
+def process_receipt_buffered(file_path):
+    """Run process_receipt in a worker process, returning (row, printed output)
+
+    Workers run side by side, so their warnings are held back and printed with the
+    file they belong to instead of interleaving on the console.
+    """
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        row = process_receipt(file_path)
+    return row, output.getvalue()
+
+
 def main():
-    if len(sys.argv) != 2:
-        print("Usage: receiptprocess <directory>")
-        sys.exit(1)
+    parser = argparse.ArgumentParser(usage="receiptprocess [--jobs N] <directory>")
+    parser.add_argument('directory')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1,
+                        help="number of receipts to process in parallel (default: CPU count)")
+    args = parser.parse_args()
 
-    target_dir = sys.argv[1]
+    target_dir = args.directory
 
     if not os.path.isdir(target_dir):
         print(f"Error: {target_dir} is not a valid directory")
         sys.exit(1)
 
-    # Find all PDF and image files in the directory
-    all_pdfs = list(Path(target_dir).glob('*.pdf'))
-    all_images = list(Path(target_dir).glob('*.jpg')) + list(Path(target_dir).glob('*.jpeg')) + list(Path(target_dir).glob('*.png'))
-    all_files = all_pdfs + all_images
+    # Find all PDF and image files in the directory in a single listing
+    with os.scandir(target_dir) as entries:
+        all_files = [Path(entry.path) for entry in entries
+                     if entry.name.lower().endswith(RECEIPT_EXTENSIONS) and entry.is_file()]
+    # PDFs first, then images, as before
+    all_files.sort(key=lambda f: (not f.name.lower().endswith('.pdf'), f.name))
 
     # Filter out files with "Pre-Approval" in the name
     receipt_files = [f for f in all_files if 'pre-approval' not in f.name.lower()]
@@ -930,25 +1283,32 @@ def main():
 
     print(f"Processing {len(receipt_files)} receipt(s)...")
 
-    # Process each receipt
-    results = []
-    for receipt_file in receipt_files:
-        print(f"  Processing: {receipt_file.name}")
-        result = process_receipt(str(receipt_file))
-        results.append(result)
-
-    # Write to CSV
+    # Process each receipt - OCR dominates and is independent per file, so fan out
+    # across processes (Vision/Quartz state is per-process). map() keeps file order.
+    # Rows are written as each result arrives rather than collected first.
     csv_path = os.path.join(target_dir, 'expenses.csv')
+    processed = 0
+    jobs = max(1, min(args.jobs, len(receipt_files)))
     with open(csv_path, 'w', newline='', encoding='utf-8') as csvfile:
         fieldnames = ['Filename', 'Date', 'Cost', 'Comment', 'Review']
         writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
 
         writer.writeheader()
-        for result in results:
-            writer.writerow(result)
+        if jobs == 1:
+            for receipt_file in receipt_files:
+                print(f"  Processing: {receipt_file.name}")
+                writer.writerow(process_receipt(str(receipt_file)))
+                processed += 1
+        else:
+            with ProcessPoolExecutor(max_workers=jobs) as executor:
+                for receipt_file, (result, output) in zip(receipt_files, executor.map(process_receipt_buffered, [str(f) for f in receipt_files])):
+                    print(f"  Processed: {receipt_file.name}")
+                    print(output, end='')
+                    writer.writerow(result)
+                    processed += 1
 
     print(f"\nExpenses CSV created: {csv_path}")
-    print(f"Processed {len(results)} receipt(s)")
+    print(f"Processed {processed} receipt(s)")
 
 
 if __name__ == "__main__":